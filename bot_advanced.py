@@ -10,108 +10,696 @@ Multi-API Support: Automatic Failover between multiple OpenAI keys
 import os
 import sys
 import asyncio
+import atexit
 import logging
-import requests
+import logging.handlers
 import random
+import re
 import base64
-from datetime import datetime
-from typing import Optional, List
-from telethon import TelegramClient
-from telethon.tl.types import Message
+import json
+import queue
+import time
+import traceback
+import hashlib
+import heapq
+import sqlite3
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, Mapping, Optional, Tuple, TypeVar
+import aiohttp
+
+try:
+    import orjson  # اختياري: ترميز/فك JSON أسرع
+except ImportError:
+    orjson = None
+
+try:
+    import uvloop  # اختياري: حلقة أحداث أسرع (لا تدعم ويندوز)
+except ImportError:
+    uvloop = None
 
 # ====== LOGGING SETUP ======
+# الكتابة الفعلية (ملف + شاشة) تتم في خيط خلفي عبر QueueListener
+# حتى لا تحجب عمليات الإدخال/الإخراج حلقة الأحداث - السجل يصبح مجرد put في طابور
+LOG_QUEUE = queue.Queue(-1)
+_log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+_stream_handler = logging.StreamHandler(sys.stdout)
+# تدوير السجل لتجنب النمو غير المحدود في وضع الخدمة المستمرة
+_file_handler = logging.handlers.RotatingFileHandler('bot.log', maxBytes=1_000_000, backupCount=3, encoding='utf-8')
+for _handler in (_stream_handler, _file_handler):
+    _handler.setFormatter(_log_formatter)
+LOG_LISTENER = logging.handlers.QueueListener(LOG_QUEUE, _stream_handler, _file_handler)
+LOG_LISTENER.start()
+# إيقاف المستمع عند الخروج لتفريغ السجلات المتبقية (يشمل sys.exit)
+atexit.register(LOG_LISTENER.stop)
+# التنسيق الكامل يتم في معالجات المستمع - هنا نص الرسالة فقط حتى لا يتكرر التنسيق
+_queue_handler = logging.handlers.QueueHandler(LOG_QUEUE)
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('bot.log', encoding='utf-8')
-    ]
+    handlers=[_queue_handler]
 )
 logger = logging.getLogger(__name__)
 
+# فواصل ثابتة للسجل وتنسيق السلسلة - تُبنى مرة واحدة
+SEP70 = "=" * 70
+SEP60 = "=" * 60
+DASH60 = "-" * 60
+
 # ====== CONFIGURATION ======
-# Telegram
-TARGET_CHANNEL = os.getenv("TELEGRAM_CHANNEL")
-API_ID = os.getenv("TELEGRAM_API_ID")
-API_HASH = os.getenv("TELEGRAM_API_HASH")
-USER_SESSION_BASE64 = os.getenv("USER_SESSION_BASE64")
-SOURCE_CHANNELS = os.getenv("SOURCE_CHANNELS", "").split(",")
-SOURCE_CHANNELS = [ch.strip() for ch in SOURCE_CHANNELS if ch.strip()]
-
-# OpenAI - Multiple API Keys Support
-OPENAI_API_KEYS = []
-primary_key = os.getenv("OPENAI_API_KEY")
-if primary_key:
-    OPENAI_API_KEYS.append(primary_key)
-
-# إضافة مفاتيح إضافية
-for i in range(2, 6):
-    key = os.getenv(f"OPENAI_API_KEY_{i}")
-    if key:
-        OPENAI_API_KEYS.append(key)
-
-# تتبع المفاتيح المحظورة مؤقتاً
+@dataclass(frozen=True, slots=True)
+class Config:
+    """إعدادات البوت - تُقرأ من متغيرات البيئة مرة واحدة عند بدء التشغيل"""
+    # Telegram
+    target_channel: Optional[str]
+    api_id: int
+    # الأسرار مستبعدة من repr حتى لا تظهر في السجلات أو تتبع الأخطاء
+    api_hash: Optional[str] = field(repr=False)
+    user_session_base64: Optional[str] = field(repr=False)
+    source_channels: Tuple[str, ...]
+    # OpenAI - Multiple API Keys Support
+    openai_api_keys: Tuple[str, ...] = field(repr=False)
+    # Settings
+    posts_limit: int
+    min_content_length: int
+    # 0 = تشغيل دورة واحدة ثم الخروج (cron)، أكبر من 0 = خدمة مستمرة بفاصل بالثواني
+    run_interval: int
+    # الحد الأقصى للقنوات التي تُجلب في نفس الوقت (لتجنب FloodWait من تيليغرام)
+    fetch_concurrency: int
+    # الميزانية الزمنية الإجمالية (بالثواني) لكل طلب OpenAI بجميع محاولاته
+    openai_total_budget: int
+    # State - ملفات الحالة المحفوظة بين التشغيلات (تُستعاد عبر GitHub Actions cache)
+    state_dir: str
+    ai_cache_ttl: int
+    # الترجمة شبه ثابتة لنفس النص - تُحفظ مدة أطول من المنشورات المولَّدة
+    translation_cache_ttl: int
+    
+    @classmethod
+    def from_env(cls) -> "Config":
+        source_channels = os.getenv("SOURCE_CHANNELS", "").split(",")
+        
+        # المفتاح الأساسي + مفاتيح إضافية OPENAI_API_KEY_2 ... OPENAI_API_KEY_5
+        key_names = ["OPENAI_API_KEY"] + [f"OPENAI_API_KEY_{i}" for i in range(2, 6)]
+        
+        return cls(
+            target_channel=os.getenv("TELEGRAM_CHANNEL"),
+            api_id=int(os.getenv("TELEGRAM_API_ID") or 0),
+            api_hash=os.getenv("TELEGRAM_API_HASH"),
+            user_session_base64=os.getenv("USER_SESSION_BASE64"),
+            source_channels=tuple(ch.strip() for ch in source_channels if ch.strip()),
+            openai_api_keys=tuple(key for key in map(os.getenv, key_names) if key),
+            posts_limit=int(os.getenv("POSTS_LIMIT", "10")),
+            min_content_length=int(os.getenv("MIN_CONTENT_LENGTH", "100")),
+            run_interval=int(os.getenv("RUN_INTERVAL", "0")),
+            fetch_concurrency=int(os.getenv("TG_CONCURRENCY", "4")),
+            openai_total_budget=int(os.getenv("OPENAI_TOTAL_BUDGET", "120")),
+            state_dir=os.getenv("BOT_STATE_DIR", ".bot_state"),
+            ai_cache_ttl=int(os.getenv("AI_CACHE_TTL", str(6 * 3600))),
+            translation_cache_ttl=int(os.getenv("TRANSLATION_CACHE_TTL", str(30 * 24 * 3600))),
+        )
+
+CFG = Config.from_env()
+
+# تتبع المفاتيح المحظورة مؤقتاً (تُرفع في بداية كل دورة)
 BLOCKED_KEYS = set()
+# مفاتيح رفضها OpenAI (401) - تبقى محظورة طوال عمر العملية
+INVALID_KEYS = set()
 
-# Settings
-POSTS_LIMIT = int(os.getenv("POSTS_LIMIT", "10"))
-MIN_CONTENT_LENGTH = int(os.getenv("MIN_CONTENT_LENGTH", "100"))
+# State - ملفات الحالة المحفوظة بين التشغيلات
+os.makedirs(CFG.state_dir, exist_ok=True)
+ENTITY_CACHE_FILE = os.path.join(CFG.state_dir, "channels.json")
+ENTITY_CACHE_TTL = 24 * 3600
+PUBLISHED_RETENTION = 30 * 24 * 3600
 
 # ====== VALIDATION ======
-if not all([TARGET_CHANNEL, API_ID, API_HASH, USER_SESSION_BASE64]):
+if not all([CFG.target_channel, CFG.api_id, CFG.api_hash, CFG.user_session_base64]):
     logger.error("❌ بيانات تيليغرام غير مكتملة")
     sys.exit(1)
 
-if not OPENAI_API_KEYS:
+if not CFG.openai_api_keys:
     logger.error("❌ لا يوجد أي مفتاح OpenAI API")
     sys.exit(1)
 
-if not SOURCE_CHANNELS:
+if not CFG.source_channels:
     logger.error("❌ قنوات المصدر غير محددة (SOURCE_CHANNELS)")
     sys.exit(1)
 
-logger.info(f"🔑 عدد مفاتيح OpenAI المتاحة: {len(OPENAI_API_KEYS)}")
+logger.info(f"🔑 عدد مفاتيح OpenAI المتاحة: {len(CFG.openai_api_keys)}")
+
+# استيراد Telethon بعد التحقق من الإعدادات: مكتبة ثقيلة (تشفير + SQLite)
+# فلا داعي لتحميلها إذا كان البوت سيتوقف بسبب إعدادات ناقصة
+from telethon import TelegramClient, utils
+from telethon.crypto import AuthKey
+from telethon.errors import ChannelInvalidError, ChatForwardsRestrictedError, FloodWaitError, PeerIdInvalidError
+from telethon.sessions import MemorySession
+from telethon.tl.types import InputPeerChannel, Message
+
+# Telethon يستخدم cryptg تلقائياً لتشفير AES إن وُجد، وإلا يرجع لتنفيذ بايثون بطيء
+try:
+    import cryptg  # noqa: F401
+except ImportError:
+    logger.warning("⚠️ مكتبة cryptg غير مثبتة - تشفير MTProto وتحميل الوسائط سيكونان أبطأ بكثير")
 
 # ====== DECODE USER SESSION ======
+def load_user_session(session_base64: str) -> MemorySession:
+    """تحميل جلسة Telethon (ملف SQLite بترميز base64) في الذاكرة مباشرة دون الكتابة على القرص"""
+    db = sqlite3.connect(":memory:")
+    try:
+        db.deserialize(base64.b64decode(session_base64))
+        row = db.execute("SELECT dc_id, server_address, port, auth_key FROM sessions").fetchone()
+    finally:
+        db.close()
+    
+    if not row or not row[3]:
+        raise ValueError("الجلسة لا تحتوي على مفتاح تسجيل دخول")
+    
+    dc_id, server_address, port, auth_key = row
+    session = MemorySession()
+    session.set_dc(dc_id, server_address, port)
+    session.auth_key = AuthKey(data=auth_key)
+    return session
+
 try:
-    with open("user_session.session", "wb") as f:
-        f.write(base64.b64decode(USER_SESSION_BASE64))
+    USER_SESSION = load_user_session(CFG.user_session_base64)
     logger.info("✅ تم فك تشفير الجلسة بنجاح")
 except Exception as e:
     logger.error(f"❌ فشل في فك تشفير الجلسة: {str(e)}")
     sys.exit(1)
 
 # ====== TELETHON CLIENT ======
-client = TelegramClient('user_session', int(API_ID), API_HASH)
+client = TelegramClient(USER_SESSION, CFG.api_id, CFG.api_hash)
+
+# ====== JSON HELPERS ======
+def json_dumps(obj) -> bytes:
+    """ترميز JSON باستخدام orjson إن كان مثبتاً"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+def json_loads(data):
+    """فك JSON باستخدام orjson إن كان مثبتاً"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# ====== CHANNEL ENTITY CACHE ======
+def load_entity_cache() -> dict:
+    """تحميل معرفات القنوات المحفوظة من التشغيلات السابقة"""
+    try:
+        with open(ENTITY_CACHE_FILE, 'rb') as f:
+            return json_loads(f.read())
+    except (OSError, ValueError):
+        return {}
+
+ENTITY_CACHE = load_entity_cache()
+
+def save_entity_cache():
+    """حفظ ذاكرة القنوات بشكل ذري"""
+    tmp_path = ENTITY_CACHE_FILE + ".tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(json_dumps(ENTITY_CACHE))
+        os.replace(tmp_path, ENTITY_CACHE_FILE)
+    except OSError as e:
+        logger.warning(f"⚠️ فشل حفظ ذاكرة القنوات: {str(e)}")
+
+async def resolve_channel(channel_username: str):
+    """تحويل اسم القناة إلى InputPeer مع تخزين مؤقت لتجنب طلب resolveUsername في كل تشغيل"""
+    entry = ENTITY_CACHE.get(channel_username)
+    if entry and entry.get("expires_at", 0) > time.time():
+        return InputPeerChannel(entry["channel_id"], entry["access_hash"])
+    
+    peer = await client.get_input_entity(channel_username)
+    if isinstance(peer, InputPeerChannel):
+        ENTITY_CACHE[channel_username] = {
+            "channel_id": peer.channel_id,
+            "access_hash": peer.access_hash,
+            "expires_at": time.time() + ENTITY_CACHE_TTL
+        }
+        save_entity_cache()
+    return peer
+
+def invalidate_channel(channel_username: str) -> bool:
+    """حذف قناة من الذاكرة عند رفض Telegram للمعرف المحفوظ (يعيد True إن كانت محفوظة)"""
+    if ENTITY_CACHE.pop(channel_username, None) is None:
+        return False
+    save_entity_cache()
+    return True
+
+# ====== HTTP SESSION ======
+# جلسة aiohttp واحدة لإعادة استخدام اتصال TLS مع OpenAI دون حجب حلقة الأحداث
+# تُنشأ داخل main() لترتبط بحلقة الأحداث الجارية
+OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
+OPENAI_MODEL = "gpt-4o-mini"
+HTTP_SESSION: Optional[aiohttp.ClientSession] = None
+# أقصى مدة انتظار بين جزأين متتاليين من الاستجابة المتدفقة
+STREAM_READ_TIMEOUT = 20
+# مهلة إنشاء الاتصال وحجم مجمع الاتصالات المشترك
+HTTP_CONNECT_TIMEOUT = 10
+HTTP_POOL_LIMIT = 64
+# إبقاء اتصالات TLS مفتوحة بين طلبات الدورة الواحدة وتخزين نتيجة DNS
+HTTP_KEEPALIVE = 60
+HTTP_DNS_TTL = 300
+
+def create_http_session() -> aiohttp.ClientSession:
+    """إنشاء جلسة HTTP مشتركة بمجمع اتصالات يُعاد استخدامه بين الطلبات"""
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT,
+            keepalive_timeout=HTTP_KEEPALIVE,
+            ttl_dns_cache=HTTP_DNS_TTL
+        ),
+        timeout=aiohttp.ClientTimeout(total=None, connect=HTTP_CONNECT_TIMEOUT, sock_read=60)
+    )
+
+# ====== AI RESPONSE CACHE ======
+# نفس النص المصدر يعيد نفس النتيجة - لا داعي لدفع ثمن طلب OpenAI مرتين
+STATE_DB = sqlite3.connect(os.path.join(CFG.state_dir, "bot_state.sqlite"))
+STATE_DB.execute(
+    "CREATE TABLE IF NOT EXISTS ai_cache ("
+    "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at INTEGER NOT NULL)"
+)
+STATE_DB.commit()
+
+def evict_ai_cache():
+    """حذف ما تجاوز أطول مدة صلاحية حتى لا تتضخم قاعدة البيانات (تُستدعى في بداية كل دورة)"""
+    STATE_DB.execute(
+        "DELETE FROM ai_cache WHERE created_at < ?",
+        (int(time.time()) - max(CFG.ai_cache_ttl, CFG.translation_cache_ttl),)
+    )
+    STATE_DB.commit()
+
+def prompt_version(*templates: str) -> str:
+    """بصمة قصيرة لقوالب الطلب - أي تعديل على القالب يُبطل النتائج المخزنة القديمة تلقائياً"""
+    return hashlib.sha256("\0".join(templates).encode('utf-8')).hexdigest()[:12]
+
+def ai_cache_key(kind: str, version: str, text: str) -> str:
+    """مفتاح التخزين: نوع المهمة + إصدار القالب + النموذج + بصمة النص المصدر"""
+    text_hash = hashlib.sha256(text.strip().encode('utf-8')).hexdigest()
+    return hashlib.sha256(f"{kind}|{version}|{OPENAI_MODEL}|{text_hash}".encode('utf-8')).hexdigest()
+
+def ai_cache_get(cache_key: str, ttl: int = CFG.ai_cache_ttl):
+    """إرجاع النتيجة المخزنة إن كانت ضمن مدة الصلاحية"""
+    row = STATE_DB.execute(
+        "SELECT response FROM ai_cache WHERE key = ? AND created_at > ?",
+        (cache_key, int(time.time()) - ttl)
+    ).fetchone()
+    return json_loads(row[0]) if row else None
+
+def ai_cache_set(cache_key: str, value):
+    """تخزين نتيجة تم التحقق منها"""
+    STATE_DB.execute(
+        "INSERT OR REPLACE INTO ai_cache (key, response, created_at) VALUES (?, ?, ?)",
+        (cache_key, json_dumps(value).decode('utf-8'), int(time.time()))
+    )
+    STATE_DB.commit()
+
+# ====== PUBLISHED CONTENT ======
+# بصمات المنشورات التي نُشرت سابقاً لتجنب إعادة نشر نفس المحتوى
+STATE_DB.execute(
+    "CREATE TABLE IF NOT EXISTS published ("
+    "hash TEXT PRIMARY KEY, published_at INTEGER NOT NULL)"
+)
+STATE_DB.commit()
+
+def content_hash(text: str) -> str:
+    """بصمة نص المنشور المصدر"""
+    return hashlib.sha1(text.strip().encode('utf-8')).hexdigest()
+
+def load_published_hashes() -> set:
+    """جميع بصمات المنشورات المنشورة ضمن مدة الاحتفاظ"""
+    rows = STATE_DB.execute(
+        "SELECT hash FROM published WHERE published_at > ?",
+        (int(time.time()) - PUBLISHED_RETENTION,)
+    ).fetchall()
+    return {row[0] for row in rows}
+
+def mark_as_published(text: str):
+    """تسجيل منشور كمنشور وحذف السجلات الأقدم من مدة الاحتفاظ"""
+    now = int(time.time())
+    STATE_DB.execute(
+        "INSERT OR REPLACE INTO published (hash, published_at) VALUES (?, ?)",
+        (content_hash(text), now)
+    )
+    STATE_DB.execute("DELETE FROM published WHERE published_at <= ?", (now - PUBLISHED_RETENTION,))
+    STATE_DB.commit()
+
+# آخر رسالة نُشرت من كل قناة - الرسائل الأقدم منها لا تُجلب مجدداً
+# ملاحظة: هذا يشمل المرشحين الأقدم الذين لم يُختاروا - بعد النشر من قناة
+# يقتصر الاختيار منها على الرسائل الأحدث فقط، ولذلك يكون "لا جديد" حالة طبيعية
+STATE_DB.execute(
+    "CREATE TABLE IF NOT EXISTS channel_cursor ("
+    "chat_id INTEGER PRIMARY KEY, last_id INTEGER NOT NULL)"
+)
+STATE_DB.commit()
+
+def get_channel_cursor(chat_id: int) -> int:
+    """معرف آخر رسالة منشورة من القناة (0 إذا لم يُنشر منها شيء)"""
+    row = STATE_DB.execute(
+        "SELECT last_id FROM channel_cursor WHERE chat_id = ?", (chat_id,)
+    ).fetchone()
+    return row[0] if row else 0
+
+def advance_channel_cursor(chat_id: int, message_id: int):
+    """تحديث مؤشر القناة بعد نشر رسالة منها"""
+    STATE_DB.execute(
+        "INSERT INTO channel_cursor (chat_id, last_id) VALUES (?, ?) "
+        "ON CONFLICT(chat_id) DO UPDATE SET last_id = MAX(last_id, excluded.last_id)",
+        (chat_id, message_id)
+    )
+    STATE_DB.commit()
 
 # ====== API KEY MANAGER ======
+# حدود افتراضية لكل مفتاح تُصحَّح تلقائياً من ترويسات x-ratelimit-* في كل استجابة
+OPENAI_RPM_LIMIT = 500
+OPENAI_TPM_LIMIT = 200_000
+
+class KeyBucket:
+    """دلو رموز لمفتاح واحد: رصيد الطلبات والتوكنات في الدقيقة يُستهلك قبل الإرسال"""
+    
+    def __init__(self, rpm: float, tpm: float):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.rpm_tokens = rpm
+        self.tpm_tokens = tpm
+        self.updated_at = time.monotonic()
+    
+    def refill(self):
+        """إعادة ملء الرصيد بحسب الوقت المنقضي منذ آخر تحديث"""
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.rpm_tokens = min(self.rpm, self.rpm_tokens + elapsed * self.rpm / 60)
+        self.tpm_tokens = min(self.tpm, self.tpm_tokens + elapsed * self.tpm / 60)
+        self.updated_at = now
+    
+    def capacity(self) -> float:
+        """نسبة الرصيد المتاح (0 - 1) بحسب الحد الأضيق"""
+        self.refill()
+        return min(self.rpm_tokens / self.rpm, self.tpm_tokens / self.tpm)
+    
+    async def acquire(self, est_tokens: int, deadline: float) -> bool:
+        """الانتظار حتى يتوفر رصيد كافٍ لطلب واحد ثم خصمه
+        
+        يُعيد False دون انتظار إذا كان الرصيد لن يتوفر قبل المهلة الإجمالية deadline.
+        """
+        needed = min(est_tokens, self.tpm)
+        while True:
+            self.refill()
+            if self.rpm_tokens >= 1 and self.tpm_tokens >= needed:
+                self.rpm_tokens -= 1
+                self.tpm_tokens -= needed
+                return True
+            wait = max((1 - self.rpm_tokens) * 60 / self.rpm,
+                       (needed - self.tpm_tokens) * 60 / self.tpm)
+            if time.monotonic() + wait >= deadline:
+                return False
+            logger.info("⏳ انتظار %.1f ثانية لتوفر رصيد المفتاح", wait)
+            await asyncio.sleep(wait)
+    
+    def sync(self, headers: Mapping[str, str]):
+        """مزامنة الرصيد مع الحدود الفعلية التي يعيدها OpenAI"""
+        self.refill()
+        try:
+            if "x-ratelimit-limit-requests" in headers:
+                self.rpm = max(1.0, float(headers["x-ratelimit-limit-requests"]))
+            if "x-ratelimit-limit-tokens" in headers:
+                self.tpm = max(1.0, float(headers["x-ratelimit-limit-tokens"]))
+            if "x-ratelimit-remaining-requests" in headers:
+                self.rpm_tokens = min(self.rpm, float(headers["x-ratelimit-remaining-requests"]))
+            if "x-ratelimit-remaining-tokens" in headers:
+                self.tpm_tokens = min(self.tpm, float(headers["x-ratelimit-remaining-tokens"]))
+        except ValueError:
+            pass
+
+KEY_BUCKETS = {key: KeyBucket(OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT) for key in CFG.openai_api_keys}
+
+# أقصى عدد طلبات متزامنة لكل مفتاح
+OPENAI_PER_KEY_CONCURRENCY = 2
+KEY_SEMAPHORES = {key: asyncio.Semaphore(OPENAI_PER_KEY_CONCURRENCY) for key in CFG.openai_api_keys}
+
+# ترتيب دوّار للمفاتيح: عند تساوي الرصيد يُختار المفتاح التالي بدلاً من الأول دائماً
+KEY_ROTATION = deque(CFG.openai_api_keys)
+
+# معاينات المفاتيح للسجل - تُبنى مرة واحدة بدلاً من تقطيع النص في كل محاولة
+KEY_PREVIEW = {key: key[:8] + "..." + key[-4:] if len(key) > 12 else "***" for key in CFG.openai_api_keys}
+
+def estimate_tokens(messages: List[dict], max_tokens: int) -> int:
+    """تقدير تقريبي لتوكنات الطلب: 4 أحرف لكل توكن + الحد الأقصى للرد"""
+    return sum(len(m["content"]) for m in messages) // 4 + max_tokens
+
 def get_next_available_key() -> Optional[str]:
-    """الحصول على المفتاح التالي المتاح"""
-    available_keys = [key for key in OPENAI_API_KEYS if key not in BLOCKED_KEYS]
+    """الحصول على المفتاح المتاح صاحب أكبر رصيد متبقٍ (بالتناوب عند التساوي)"""
+    KEY_ROTATION.rotate(-1)
+    available_keys = [key for key in KEY_ROTATION if key not in BLOCKED_KEYS]
     
     if not available_keys:
         logger.error("❌ جميع مفاتيح API محظورة أو مستنفدة!")
-        BLOCKED_KEYS.clear()
         logger.warning("⚠️ إعادة تعيين قائمة المفاتيح المحظورة...")
-        return OPENAI_API_KEYS[0] if OPENAI_API_KEYS else None
+        reset_blocked_keys()
+        available_keys = [key for key in KEY_ROTATION if key not in BLOCKED_KEYS]
+        if not available_keys:
+            return None
     
-    return available_keys[0]
+    return max(available_keys, key=lambda key: KEY_BUCKETS[key].capacity())
 
-def mark_key_as_blocked(api_key: str):
-    """وضع علامة على مفتاح كمحظور مؤقتاً"""
+def reset_blocked_keys():
+    """رفع الحظر المؤقت عن المفاتيح مع إبقاء المفاتيح غير الصالحة محظورة"""
+    BLOCKED_KEYS.clear()
+    BLOCKED_KEYS.update(INVALID_KEYS)
+
+def mark_key_as_blocked(api_key: str, permanent: bool = False):
+    """وضع علامة على مفتاح كمحظور مؤقتاً، أو نهائياً إذا كان غير صالح"""
     if api_key:
         BLOCKED_KEYS.add(api_key)
-        key_preview = api_key[:8] + "..." + api_key[-4:] if len(api_key) > 12 else "***"
-        logger.warning(f"🚫 تم حظر المفتاح مؤقتاً: {key_preview}")
-        logger.info(f"📊 المفاتيح المتبقية: {len(OPENAI_API_KEYS) - len(BLOCKED_KEYS)}/{len(OPENAI_API_KEYS)}")
+        key_preview = KEY_PREVIEW.get(api_key, "***")
+        if permanent:
+            INVALID_KEYS.add(api_key)
+            logger.warning("⛔ تم تعطيل المفتاح نهائياً (غير صالح): %s", key_preview)
+        else:
+            logger.warning("🚫 تم حظر المفتاح مؤقتاً: %s", key_preview)
+        logger.info("📊 المفاتيح المتبقية: %d/%d",
+                    len(CFG.openai_api_keys) - len(BLOCKED_KEYS), len(CFG.openai_api_keys))
+
+# ====== RETRY BACKOFF ======
+def backoff(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """مدة الانتظار قبل إعادة المحاولة: تصاعد أسي مع حد أقصى وتشويش كامل (full jitter)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+DURATION_PART_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+def parse_reset_duration(value: str) -> Optional[float]:
+    """تحويل مدة بصيغة OpenAI مثل 6m0s أو 20ms إلى ثوانٍ"""
+    parts = DURATION_PART_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+async def sleep_within(deadline: float, delay: float) -> None:
+    """الانتظار قبل إعادة المحاولة دون تجاوز المهلة الإجمالية"""
+    await asyncio.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+
+def retry_delay(headers: Mapping[str, str], attempt: int, cap: float = 60.0) -> float:
+    """احترام Retry-After ثم x-ratelimit-reset-requests إن وُجدتا، وإلا الرجوع إلى التصاعد الأسي"""
+    retry_after = headers.get("Retry-After")
+    if retry_after:
+        try:
+            return min(cap, max(0.0, float(retry_after)) + random.random())
+        except ValueError:
+            pass
+    reset = parse_reset_duration(headers.get("x-ratelimit-reset-requests", ""))
+    if reset is not None:
+        return min(cap, reset + random.random())
+    return backoff(attempt)
+
+# ====== OPENAI REQUEST ======
+async def read_chat_stream(response: aiohttp.ClientResponse) -> str:
+    """تجميع أجزاء الاستجابة المتدفقة (Server-Sent Events) في نص واحد"""
+    parts = []
+    async for raw_line in response.content:
+        line = raw_line.strip()
+        if not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            break
+        choices = json_loads(data).get("choices")
+        if choices:
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                parts.append(delta)
+    return "".join(parts)
+
+
+# الأخطاء المؤقتة التي تستحق إعادة المحاولة - أي خطأ آخر يُعتبر نهائياً
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+async def _call_openai(messages: List[dict], temperature: float, max_tokens: int,
+                       timeout: int, max_retries: int, label: str,
+                       validate: Callable[[str], Optional[T]],
+                       cache_key: Optional[str] = None,
+                       cache_ttl: int = CFG.ai_cache_ttl) -> Optional[T]:
+    """إرسال طلب إلى OpenAI مع تدوير المفاتيح وإعادة المحاولة عند الأخطاء المؤقتة فقط
+    
+    validate تستقبل النص المولَّد وتعيد النتيجة النهائية، أو None لإعادة المحاولة.
+    إذا مُرِّر cache_key تُخزَّن النتيجة الصالحة ويُعاد استخدامها خلال cache_ttl ثانية.
+    """
+    if cache_key:
+        cached = ai_cache_get(cache_key, cache_ttl)
+        if cached is not None:
+            logger.info("💾 X-Cache: HIT - %s", label)
+            return cached
+        logger.info("💾 X-Cache: MISS - %s", label)
+    
+    est_tokens = estimate_tokens(messages, max_tokens)
+    deadline = time.monotonic() + CFG.openai_total_budget
+    for attempt in range(1, max_retries + 1):
+        current_key = get_next_available_key()
+        if not current_key:
+            logger.error("❌ لا توجد مفاتيح API متاحة!")
+            return None
+        
+        # انتظار الرصيد ومقعد التزامن محكوم أيضاً بالمهلة الإجمالية
+        semaphore = KEY_SEMAPHORES[current_key]
+        acquired = await KEY_BUCKETS[current_key].acquire(est_tokens, deadline)
+        if acquired:
+            try:
+                await asyncio.wait_for(semaphore.acquire(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                acquired = False
+        
+        remaining = deadline - time.monotonic()
+        if not acquired or remaining < 1:
+            if acquired:
+                semaphore.release()
+            logger.error("⏱️ %s - انتهت المهلة الإجمالية (%d ثانية)", label, CFG.openai_total_budget)
+            return None
+        
+        key_preview = KEY_PREVIEW[current_key]
+        logger.info("%s - محاولة %d/%d", label, attempt, max_retries)
+        logger.info("🔑 استخدام المفتاح: %s", key_preview)
+        
+        try:
+            async with HTTP_SESSION.post(
+                OPENAI_API_URL,
+                headers={
+                    "Authorization": f"Bearer {current_key}",
+                    "Content-Type": "application/json"
+                },
+                data=json_dumps({
+                    "model": OPENAI_MODEL,
+                    "messages": messages,
+                    "temperature": temperature,
+                    "max_tokens": max_tokens,
+                    "stream": True
+                }),
+                timeout=aiohttp.ClientTimeout(
+                    total=min(timeout, remaining),
+                    connect=HTTP_CONNECT_TIMEOUT,
+                    sock_read=STREAM_READ_TIMEOUT
+                )
+            ) as response:
+                status = response.status
+                headers = response.headers
+                if status == 200:
+                    content = await read_chat_stream(response)
+                else:
+                    body = await response.read()
+        except (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError) as e:
+            logger.error("❌ خطأ في الاتصال بـ OpenAI: %s", str(e) or type(e).__name__)
+            if attempt < max_retries:
+                await sleep_within(deadline, backoff(attempt))
+            continue
+        except aiohttp.ClientError as e:
+            logger.error("❌ خطأ في طلب OpenAI: %s", e)
+            return None
+        except (ValueError, KeyError, IndexError) as e:
+            logger.error("❌ استجابة غير صالحة من OpenAI: %s", e)
+            return None
+        finally:
+            semaphore.release()
+        
+        KEY_BUCKETS[current_key].sync(headers)
+        
+        if status == 200:
+            result = validate(content.strip())
+            if result is not None:
+                if cache_key:
+                    ai_cache_set(cache_key, result)
+                return result
+            continue
+        
+        if status in RETRYABLE_STATUS:
+            rotated = False
+            if status == 429:
+                logger.error("🚫 خطأ 429 - المفتاح %s", key_preview)
+                mark_key_as_blocked(current_key)
+                # الانتقال لمفتاح آخر غير محظور لا يحتاج انتظاراً
+                rotated = len(BLOCKED_KEYS) < len(CFG.openai_api_keys)
+            else:
+                logger.error("❌ خطأ مؤقت من OpenAI: %d", status)
+            
+            if attempt < max_retries and not rotated:
+                await sleep_within(deadline, retry_delay(headers, attempt))
+            continue
+        
+        if status == 401:
+            # مفتاح غير صالح - الخطأ يخص المفتاح لا الطلب، فننتقل فوراً لمفتاح آخر إن وُجد
+            logger.error("🔒 خطأ 401 - المفتاح %s غير صالح", key_preview)
+            mark_key_as_blocked(current_key, permanent=True)
+            if len(BLOCKED_KEYS) < len(CFG.openai_api_keys):
+                continue
+            return None
+        
+        # خطأ نهائي (طلب خاطئ، صلاحيات...) - لا فائدة من إعادة المحاولة
+        logger.error("❌ خطأ غير قابل لإعادة المحاولة: %d", status)
+        try:
+            logger.error("   التفاصيل: %s", json_loads(body))
+        except ValueError:
+            pass
+        return None
+    
+    return None
 
 # ====== LANGUAGE DETECTION ======
+# العد عبر تعابير منتظمة مُجمَّعة يتم في C بدلاً من حلقة بايثون لكل حرف
+ARABIC_RE = re.compile(r"[\u0600-\u06FF]")
+CYRILLIC_RE = re.compile(r"[\u0400-\u04FF]")
+LETTER_RE = re.compile(r"[^\W\d_]")
+NON_ARABIC_LETTER_RE = re.compile(r"[^\W\d_\u0600-\u06FF]")
+
+def count_arabic(text: str) -> int:
+    """عدد الأحرف ضمن النطاق العربي"""
+    return len(ARABIC_RE.findall(text))
+
+def count_letters(text: str) -> int:
+    """عدد الأحرف الأبجدية بجميع اللغات"""
+    return len(LETTER_RE.findall(text))
+
+def arabic_ratio(text: str) -> float:
+    """نسبة الأحرف العربية إلى مجموع الأحرف الأبجدية (0 إذا لم توجد أحرف)"""
+    total_letters = count_letters(text)
+    return count_arabic(text) / total_letters if total_letters else 0.0
+
+# حجم العينة من بداية النص للمسار السريع في كشف اللغة
+LANGUAGE_SAMPLE_SIZE = 512
+
 def detect_language(text: str) -> str:
     """كشف اللغة الأساسية للنص"""
-    arabic_chars = sum(1 for c in text if '\u0600' <= c <= '\u06FF')
-    latin_chars = sum(1 for c in text if c.isalpha() and not ('\u0600' <= c <= '\u06FF'))
-    cyrillic_chars = sum(1 for c in text if '\u0400' <= c <= '\u04FF')
+    # مسار سريع: إذا كانت بداية النص عربية بوضوح فلا داعي لفحص النص كاملاً
+    if len(text) > LANGUAGE_SAMPLE_SIZE:
+        sample = text[:LANGUAGE_SAMPLE_SIZE]
+        sample_letters = count_letters(sample)
+        if sample_letters and count_arabic(sample) / sample_letters > 0.8:
+            return "arabic"
+    
+    arabic_chars = count_arabic(text)
+    latin_chars = len(NON_ARABIC_LETTER_RE.findall(text))
+    cyrillic_chars = len(CYRILLIC_RE.findall(text))
     
     total_alpha = arabic_chars + latin_chars + cyrillic_chars
     
@@ -128,22 +716,9 @@ def detect_language(text: str) -> str:
         return "other"
 
 # ====== TRANSLATION TO ARABIC ======
-async def translate_to_arabic(text: str, max_retries: int = 2) -> Optional[str]:
-    """ترجمة النص إلى العربية باستخدام OpenAI"""
-    
-    for attempt in range(1, max_retries + 1):
-        current_key = get_next_available_key()
-        if not current_key:
-            logger.error("❌ لا توجد مفاتيح API متاحة للترجمة!")
-            return None
-        
-        key_preview = current_key[:8] + "..." + current_key[-4:]
-        logger.info(f"🔄 ترجمة المحتوى إلى العربية - محاولة {attempt}/{max_retries}")
-        logger.info(f"🔑 استخدام المفتاح: {key_preview}")
-        
-        system_message = "أنت مترجم محترف. مهمتك ترجمة أي نص إلى اللغة العربية الفصحى الحديثة (وليس العامية أو الدارجة)."
-        
-        user_prompt = f"""ترجم هذا النص إلى العربية الفصحى الحديثة:
+TRANSLATE_AR_SYSTEM = "أنت مترجم محترف. مهمتك ترجمة أي نص إلى اللغة العربية الفصحى الحديثة (وليس العامية أو الدارجة)."
+
+TRANSLATE_AR_PROMPT = """ترجم هذا النص إلى العربية الفصحى الحديثة:
 
 ⚠️ مهم: استخدم العربية الفصحى فقط - وليس العامية!
 
@@ -151,223 +726,204 @@ async def translate_to_arabic(text: str, max_retries: int = 2) -> Optional[str]:
 {text}
 
 الترجمة بالعربية الفصحى (فقط الترجمة بدون أي إضافات):"""
-        
-        try:
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {current_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "gpt-4o-mini",
-                    "messages": [
-                        {"role": "system", "content": system_message},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    "temperature": 0.3,
-                    "max_tokens": 2000
-                },
-                timeout=45
-            )
-            
-            if response.status_code == 200:
-                translation = response.json()['choices'][0]['message']['content'].strip()
-                
-                # تحقق من أن الترجمة بالعربية
-                arabic_chars = sum(1 for c in translation if '\u0600' <= c <= '\u06FF')
-                total_chars = len([c for c in translation if c.isalpha()])
-                
-                if total_chars > 0:
-                    arabic_ratio = arabic_chars / total_chars
-                    if arabic_ratio > 0.5:
-                        logger.info(f"✅ تمت الترجمة بنجاح! ({len(translation)} حرف)")
-                        return translation
-                    else:
-                        logger.warning(f"⚠️ الترجمة ليست بالعربية ({arabic_ratio*100:.1f}% فقط)")
-                        if attempt < max_retries:
-                            await asyncio.sleep(2)
-                            continue
-                
-            elif response.status_code == 429:
-                logger.error(f"🚫 خطأ 429 - المفتاح {key_preview}")
-                mark_key_as_blocked(current_key)
-                
-                # تحذير إذا نفذت المفاتيح
-                if len(BLOCKED_KEYS) >= len(OPENAI_API_KEYS):
-                    logger.error("❌ جميع المفاتيح وصلت للحد الأقصى في الترجمة!")
-                    return None
-                
-                await asyncio.sleep(2)
-                continue
-                
-            else:
-                logger.error(f"❌ خطأ في الترجمة: {response.status_code}")
-                
-        except Exception as e:
-            logger.error(f"❌ خطأ في الترجمة: {str(e)}")
-        
-        if attempt < max_retries:
-            await asyncio.sleep(3)
+TRANSLATE_AR_VERSION = prompt_version(TRANSLATE_AR_SYSTEM, TRANSLATE_AR_PROMPT)
+
+async def translate_to_arabic(text: str, max_retries: int = 2) -> Optional[str]:
+    """ترجمة النص إلى العربية باستخدام OpenAI"""
     
-    logger.error("❌ فشلت الترجمة بعد جميع المحاولات")
-    return None
+    user_prompt = TRANSLATE_AR_PROMPT.format(text=text)
+    
+    def validate(translation: str) -> Optional[str]:
+        # تحقق من أن الترجمة بالعربية
+        ratio = arabic_ratio(translation)
+        if ratio > 0.5:
+            logger.info(f"✅ تمت الترجمة بنجاح! ({len(translation)} حرف)")
+            return translation
+        
+        logger.warning(f"⚠️ الترجمة ليست بالعربية ({ratio*100:.1f}% فقط)")
+        return None
+    
+    translation = await _call_openai(
+        messages=[
+            {"role": "system", "content": TRANSLATE_AR_SYSTEM},
+            {"role": "user", "content": user_prompt}
+        ],
+        temperature=0.3,
+        max_tokens=2000,
+        timeout=45,
+        max_retries=max_retries,
+        label="🔄 ترجمة المحتوى إلى العربية",
+        validate=validate,
+        cache_key=ai_cache_key("translate_ar", TRANSLATE_AR_VERSION, text),
+        cache_ttl=CFG.translation_cache_ttl
+    )
+    
+    if not translation:
+        logger.error("❌ فشلت الترجمة بعد جميع المحاولات")
+    return translation
 
 # ====== TRANSLATION TO ENGLISH ======
-async def translate_to_english(text: str, max_retries: int = 2) -> Optional[str]:
-    """ترجمة النص إلى الإنجليزية باستخدام OpenAI"""
-    
-    for attempt in range(1, max_retries + 1):
-        current_key = get_next_available_key()
-        if not current_key:
-            logger.error("❌ لا توجد مفاتيح API متاحة للترجمة!")
-            return None
-        
-        key_preview = current_key[:8] + "..." + current_key[-4:]
-        logger.info(f"🔄 ترجمة المحتوى إلى الإنجليزية - محاولة {attempt}/{max_retries}")
-        logger.info(f"🔑 استخدام المفتاح: {key_preview}")
-        
-        system_message = "You are a professional translator. Your task is to translate any text to clear, natural English."
-        
-        user_prompt = f"""Translate this text to English:
+TRANSLATE_EN_SYSTEM = "You are a professional translator. Your task is to translate any text to clear, natural English."
+
+TRANSLATE_EN_PROMPT = """Translate this text to English:
 
 {text}
 
 English translation (only the translation, no extra comments):"""
+TRANSLATE_EN_VERSION = prompt_version(TRANSLATE_EN_SYSTEM, TRANSLATE_EN_PROMPT)
+
+async def translate_to_english(text: str, max_retries: int = 2) -> Optional[str]:
+    """ترجمة النص إلى الإنجليزية باستخدام OpenAI"""
+    
+    user_prompt = TRANSLATE_EN_PROMPT.format(text=text)
+    
+    def validate(translation: str) -> Optional[str]:
+        # تحقق من أن الترجمة بالإنجليزية (لا توجد أحرف عربية) - search يتوقف عند أول حرف
+        has_arabic = ARABIC_RE.search(translation) is not None
         
-        try:
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {current_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "gpt-4o-mini",
-                    "messages": [
-                        {"role": "system", "content": system_message},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    "temperature": 0.3,
-                    "max_tokens": 2000
-                },
-                timeout=45
-            )
-            
-            if response.status_code == 200:
-                translation = response.json()['choices'][0]['message']['content'].strip()
-                
-                # تحقق من أن الترجمة بالإنجليزية (لا توجد أحرف عربية)
-                arabic_chars = sum(1 for c in translation if '\u0600' <= c <= '\u06FF')
-                
-                if arabic_chars == 0 and len(translation) > 20:
-                    logger.info(f"✅ تمت الترجمة للإنجليزية بنجاح! ({len(translation)} حرف)")
-                    return translation
-                else:
-                    logger.warning(f"⚠️ الترجمة تحتوي على {arabic_chars} حرف عربي")
-                    if attempt < max_retries:
-                        await asyncio.sleep(2)
-                        continue
-                
-            elif response.status_code == 429:
-                logger.error(f"🚫 خطأ 429 - المفتاح {key_preview}")
-                mark_key_as_blocked(current_key)
-                await asyncio.sleep(2)
-                continue
-                
-            else:
-                logger.error(f"❌ خطأ في الترجمة: {response.status_code}")
-                
-        except Exception as e:
-            logger.error(f"❌ خطأ في الترجمة: {str(e)}")
+        if not has_arabic and len(translation) > 20:
+            logger.info(f"✅ تمت الترجمة للإنجليزية بنجاح! ({len(translation)} حرف)")
+            return translation
         
-        if attempt < max_retries:
-            await asyncio.sleep(3)
+        logger.warning("⚠️ الترجمة تحتوي على %d حرف عربي", count_arabic(translation))
+        return None
     
-    logger.error("❌ فشلت الترجمة للإنجليزية بعد جميع المحاولات")
-    return None
+    translation = await _call_openai(
+        messages=[
+            {"role": "system", "content": TRANSLATE_EN_SYSTEM},
+            {"role": "user", "content": user_prompt}
+        ],
+        temperature=0.3,
+        max_tokens=2000,
+        timeout=45,
+        max_retries=max_retries,
+        label="🔄 ترجمة المحتوى إلى الإنجليزية",
+        validate=validate,
+        cache_key=ai_cache_key("translate_en", TRANSLATE_EN_VERSION, text),
+        cache_ttl=CFG.translation_cache_ttl
+    )
+    
+    if not translation:
+        logger.error("❌ فشلت الترجمة للإنجليزية بعد جميع المحاولات")
+    return translation
 
 # ====== FETCH FROM TELEGRAM ======
-async def fetch_recent_posts(channel_username: str, limit: int = 10) -> List[Message]:
-    """جلب المنشورات من قناة تيليغرام"""
+async def fetch_recent_posts(channel_username: str, limit: int = 10) -> Optional[List[Message]]:
+    """جلب المنشورات من قناة تيليغرام (None عند فشل الجلب، وقائمة فارغة إن لم يوجد جديد)"""
+    async def collect(entity) -> List[Message]:
+        collected = []
+        min_id = get_channel_cursor(utils.get_peer_id(entity))
+        async for message in client.iter_messages(entity, limit=limit, min_id=min_id, wait_time=0):
+            if message.text and len(message.text) >= CFG.min_content_length:
+                collected.append(message)
+            elif (message.photo or message.video) and message.text:
+                collected.append(message)
+        return collected
+    
     messages = []
     try:
-        logger.info(f"📥 جاري جلب المحتوى من @{channel_username}...")
-        async for message in client.iter_messages(channel_username, limit=limit):
-            if message.text and len(message.text) >= MIN_CONTENT_LENGTH:
-                messages.append(message)
-            elif (message.photo or message.video) and message.text:
-                messages.append(message)
-        logger.info(f"✅ تم جلب {len(messages)} منشور من @{channel_username}")
+        logger.info("📥 جاري جلب المحتوى من @%s...", channel_username)
+        try:
+            messages = await collect(await resolve_channel(channel_username))
+        except (ChannelInvalidError, PeerIdInvalidError):
+            # المعرف المحفوظ لم يعد صالحاً - تحديثه مرة واحدة فقط ثم إعادة الجلب
+            if not invalidate_channel(channel_username):
+                raise
+            logger.warning("⚠️ معرف @%s المحفوظ غير صالح، إعادة التحديد...", channel_username)
+            messages = await collect(await resolve_channel(channel_username))
+        logger.info("✅ تم جلب %d منشور من @%s", len(messages), channel_username)
     except Exception as e:
-        logger.error(f"❌ خطأ في جلب المحتوى من @{channel_username}: {str(e)}")
+        logger.error("❌ خطأ في جلب المحتوى من @%s: %s", channel_username, e)
+        return None
     return messages
 
 async def get_content_from_sources() -> Optional[Message]:
-    """جلب محتوى عشوائي من المصادر"""
-    all_messages = []
-    for channel in SOURCE_CHANNELS:
-        msgs = await fetch_recent_posts(channel, POSTS_LIMIT)
-        all_messages.extend(msgs)
+    """جلب محتوى عشوائي من المصادر
+    
+    يُعيد None إذا لم يوجد محتوى جديد مناسب (حالة طبيعية)، ويرفع RuntimeError
+    إذا فشل الجلب من جميع القنوات.
+    """
+    # جلب جميع القنوات بالتوازي عبر نفس اتصال Telethon - والـ semaphore يحدد السقف
+    # لذا لا حاجة لتأخير Telethon الداخلي بين الطلبات (wait_time=0)
+    semaphore = asyncio.Semaphore(CFG.fetch_concurrency)
+    
+    async def fetch_bounded(channel: str) -> Optional[List[Message]]:
+        async with semaphore:
+            return await fetch_recent_posts(channel, CFG.posts_limit)
+    
+    results = await asyncio.gather(
+        *(fetch_bounded(ch) for ch in CFG.source_channels),
+        return_exceptions=True
+    )
+    if not any(isinstance(r, list) for r in results):
+        raise RuntimeError("فشل الجلب من جميع القنوات المصدر")
+    # نحتفظ باسم القناة المصدر مع كل منشور بدلاً من الوصول لاحقاً إلى message.chat
+    all_messages = [
+        (channel, m)
+        for channel, r in zip(CFG.source_channels, results) if isinstance(r, list)
+        for m in r
+    ]
     
     if not all_messages:
-        logger.warning("⚠️ لم يتم العثور على محتوى من أي مصدر")
+        logger.info("📭 لا توجد منشورات جديدة في القنوات المصدر")
         return None
     
-    filtered_messages = [
-        msg for msg in all_messages 
-        if msg.text and len(msg.text.strip()) >= MIN_CONTENT_LENGTH
+    # استبعاد المنشورات التي نُشرت سابقاً قبل أي طلب لـ OpenAI
+    published = load_published_hashes()
+    fresh_messages = [
+        (channel, m) for channel, m in all_messages
+        if m.text and content_hash(m.text) not in published
     ]
+    skipped = len(all_messages) - len(fresh_messages)
+    if skipped:
+        logger.info(f"♻️ تم استبعاد {skipped} منشور سبق نشره")
+    all_messages = fresh_messages
     
-    if not filtered_messages:
-        min_acceptable = MIN_CONTENT_LENGTH // 2
-        filtered_messages = [
-            msg for msg in all_messages 
-            if msg.text and len(msg.text.strip()) >= min_acceptable
-        ]
-        
-        if not filtered_messages:
-            logger.error("❌ لا توجد منشورات مناسبة")
-            return None
+    if not all_messages:
+        logger.info("📭 جميع المنشورات المتاحة سبق نشرها")
+        return None
     
-    filtered_messages.sort(key=lambda m: len(m.text) if m.text else 0, reverse=True)
-    top_candidates = filtered_messages[:max(1, len(filtered_messages) // 3)]
-    selected = random.choice(top_candidates)
+    # تصنيف في مرور واحد: الطول الكافي أولاً، ونصف الحد الأدنى كخيار احتياطي
+    preferred, acceptable = [], []
+    min_acceptable = CFG.min_content_length // 2
+    for channel, msg in all_messages:
+        length = len(msg.text.strip())
+        if length >= CFG.min_content_length:
+            preferred.append((length, channel, msg))
+        elif length >= min_acceptable:
+            acceptable.append((length, channel, msg))
     
-    source = selected.chat.username or selected.chat.title or 'unknown'
-    text_length = len(selected.text) if selected.text else 0
+    filtered_messages = preferred or acceptable
+    if not filtered_messages:
+        logger.info("📭 لا توجد منشورات بطول مناسب")
+        return None
+    
+    # أطول ثلث فقط - لا داعي لترتيب القائمة كاملة
+    top_candidates = heapq.nlargest(
+        max(1, len(filtered_messages) // 3),
+        filtered_messages,
+        key=lambda item: item[0]
+    )
+    text_length, source, selected = random.choice(top_candidates)
     logger.info(f"✅ تم اختيار منشور من @{source} ({text_length} حرف)")
     
     return selected
 
 # ====== AI CONTENT GENERATION - ARABIC ======
-async def generate_arabic_post(text: str, max_retries: int = 3) -> Optional[str]:
-    """توليد منشور عربي احترافي لفيسبوك/إنستغرام"""
-    
-    for attempt in range(1, max_retries + 1):
-        current_key = get_next_available_key()
-        if not current_key:
-            logger.error("❌ لا توجد مفاتيح API متاحة!")
-            return None
-        
-        key_preview = current_key[:8] + "..." + current_key[-4:]
-        logger.info(f"🤖 توليد المنشور العربي - محاولة {attempt}/{max_retries}")
-        logger.info(f"🔑 استخدام المفتاح: {key_preview}")
-        
-        system_message = """أنت خبير تسويق محتوى عربي متخصص في إنشاء منشورات جذابة لفيسبوك وإنستغرام.
+# التعليمات الثابتة كلها في رسالة النظام والنص المتغير في النهاية فقط:
+# بادئة ثابتة بين الطلبات تتيح لـ OpenAI تفعيل التخزين المؤقت للمدخلات (prompt caching)
+ARABIC_POST_SYSTEM = """أنت خبير تسويق محتوى عربي متخصص في إنشاء منشورات جذابة لفيسبوك وإنستغرام.
 يجب أن تكتب باللغة العربية الفصحى الحديثة فقط - وليس بالعامية أو الدارجة.
-أسلوبك احترافي، واضح، وسهل الفهم."""
+إذا كان المحتوى بلغة أخرى، ترجمه أولاً إلى العربية الفصحى ثم أعد صياغته.
+أسلوبك احترافي، واضح، وسهل الفهم.
 
-        user_prompt = f"""أعد كتابة هذا المحتوى بشكل احترافي وجذاب للنشر على فيسبوك وإنستغرام:
+أعد كتابة هذا المحتوى بشكل احترافي وجذاب للنشر على فيسبوك وإنستغرام:
 
 **⚠️ مهم جداً: اكتب بالعربية الفصحى الحديثة فقط!**
 - لا تستخدم العامية أو الدارجة أبداً
 - لا تستخدم كلمات مثل: "بحطلك"، "يدورلك"، "عشان"، "تبي"، "هالموقع"
 - استخدم: "سأضع"، "يبحث"، "لكي"، "تريد"، "هذا الموقع"
 
-📋 المحتوى الأصلي:
-{text}
-
 ✅ المتطلبات:
 1. عنوان قوي وجذاب بالعربية الفصحى مع إيموجي مناسب
 2. محتوى مفصّل: 10-15 سطراً بالعربية الفصحى
@@ -388,92 +944,58 @@ async def generate_arabic_post(text: str, max_retries: int = 3) -> Optional[str]
 - الكتابة بالإنجليزية
 - المحتوى القصير
 - العامية أو الدارجة
-- كلمات: "بالطبع"، "يُرجى"
+- كلمات: "بالطبع"، "يُرجى"."""
+
+ARABIC_POST_PROMPT = """📋 المحتوى الأصلي (قد يكون بلغة أخرى - ترجمه إلى العربية الفصحى):
+{text}
 
 المنشور بالعربية الفصحى الحديثة:"""
+ARABIC_POST_VERSION = prompt_version(ARABIC_POST_SYSTEM, ARABIC_POST_PROMPT)
+
+async def generate_arabic_post(text: str, max_retries: int = 3) -> Optional[str]:
+    """توليد منشور عربي احترافي لفيسبوك/إنستغرام"""
+    
+    user_prompt = ARABIC_POST_PROMPT.format(text=text)
+    
+    def validate(result: str) -> Optional[str]:
+        # تحقق من أن المحتوى بالعربية
+        ratio = arabic_ratio(result)
         
-        try:
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {current_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "gpt-4o-mini",
-                    "messages": [
-                        {"role": "system", "content": system_message},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    "temperature": 0.8,
-                    "max_tokens": 2000
-                },
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                result = response.json()['choices'][0]['message']['content'].strip()
-                
-                # تحقق من أن المحتوى بالعربية
-                arabic_chars = sum(1 for c in result if '\u0600' <= c <= '\u06FF')
-                total_chars = len([c for c in result if c.isalpha()])
-                
-                if total_chars > 0:
-                    arabic_ratio = arabic_chars / total_chars
-                    
-                    if arabic_ratio > 0.6 and len(result) > 300:
-                        logger.info(f"✅ تم توليد المنشور العربي ({len(result)} حرف، {arabic_ratio*100:.1f}% عربي)")
-                        return result
-                    else:
-                        logger.warning(f"⚠️ المحتوى غير مناسب (عربي: {arabic_ratio*100:.1f}%, طول: {len(result)})")
-                        if attempt < max_retries:
-                            await asyncio.sleep(3)
-                            continue
-                
-            elif response.status_code == 429:
-                logger.error(f"🚫 خطأ 429 - المفتاح {key_preview}")
-                mark_key_as_blocked(current_key)
-                await asyncio.sleep(2)
-                continue
-                
-            else:
-                logger.error(f"❌ خطأ: {response.status_code}")
-                
-        except Exception as e:
-            logger.error(f"❌ خطأ في التوليد: {str(e)}")
+        if ratio > 0.6 and len(result) > 300:
+            logger.info(f"✅ تم توليد المنشور العربي ({len(result)} حرف، {ratio*100:.1f}% عربي)")
+            return result
         
-        if attempt < max_retries:
-            await asyncio.sleep(5)
+        logger.warning(f"⚠️ المحتوى غير مناسب (عربي: {ratio*100:.1f}%, طول: {len(result)})")
+        return None
     
-    logger.error("❌ فشل توليد المنشور العربي")
-    return None
+    result = await _call_openai(
+        messages=[
+            {"role": "system", "content": ARABIC_POST_SYSTEM},
+            {"role": "user", "content": user_prompt}
+        ],
+        temperature=0.8,
+        max_tokens=2000,
+        timeout=60,
+        max_retries=max_retries,
+        label="🤖 توليد المنشور العربي",
+        validate=validate,
+        cache_key=ai_cache_key("arabic_post", ARABIC_POST_VERSION, text)
+    )
+    
+    if not result:
+        logger.error("❌ فشل توليد المنشور العربي")
+    return result
 
 # ====== AI CONTENT GENERATION - ENGLISH TWITTER ======
-async def generate_english_twitter_thread(text: str, max_retries: int = 3) -> Optional[List[str]]:
-    """توليد سلسلة تغريدات إنجليزية لتويتر"""
-    
-    for attempt in range(1, max_retries + 1):
-        current_key = get_next_available_key()
-        if not current_key:
-            logger.error("❌ لا توجد مفاتيح API متاحة!")
-            return None
-        
-        key_preview = current_key[:8] + "..." + current_key[-4:]
-        logger.info(f"🐦 توليد سلسلة التغريدات - محاولة {attempt}/{max_retries}")
-        logger.info(f"🔑 استخدام المفتاح: {key_preview}")
-        
-        system_message = """You are a professional Twitter/X content strategist.
+TWITTER_THREAD_SYSTEM = """You are a professional Twitter/X content strategist.
 You MUST write ENTIRELY IN ENGLISH - NO Arabic characters allowed.
 If the input is in Arabic or another language, you MUST translate it to English first.
-Create engaging, viral-worthy Twitter threads in perfect English."""
+Create engaging, viral-worthy Twitter threads in perfect English.
 
-        user_prompt = f"""Create a professional English Twitter/X thread (6-10 tweets) from this content.
+Create a professional English Twitter/X thread (6-10 tweets) from this content.
 
 ⚠️ CRITICAL: Write ONLY in ENGLISH! If the content below is in Arabic or another language, TRANSLATE IT TO ENGLISH FIRST!
 
-📋 Original Content:
-{text}
-
 ✅ STRICT Requirements:
 1. **100% ENGLISH ONLY** - Zero Arabic characters!
 2. If content is Arabic → Translate to English first
@@ -495,116 +1017,73 @@ Create engaging, viral-worthy Twitter threads in perfect English."""
 - Generic corporate speak
 - Tweets over 280 characters
 
-REMEMBER: Every single word must be in ENGLISH!
+REMEMBER: Every single word must be in ENGLISH!"""
+
+TWITTER_THREAD_PROMPT = """📋 Original Content:
+{text}
 
 The Twitter Thread in ENGLISH:"""
-        
-        try:
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {current_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "gpt-4o-mini",
-                    "messages": [
-                        {"role": "system", "content": system_message},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    "temperature": 0.7,  # أقل قليلاً للحصول على نتائج أكثر دقة
-                    "max_tokens": 2000
-                },
-                timeout=60
-            )
+TWITTER_THREAD_VERSION = prompt_version(TWITTER_THREAD_SYSTEM, TWITTER_THREAD_PROMPT)
+
+# سطر "TWEET N: ..." - المحتوى هو ما بعد أول نقطتين
+TWEET_RE = re.compile(r"^[ \t]*TWEET [^:\n]*:(.*)$", re.M)
+
+async def generate_english_twitter_thread(text: str, max_retries: int = 3) -> Optional[List[str]]:
+    """توليد سلسلة تغريدات إنجليزية لتويتر"""
+    
+    user_prompt = TWITTER_THREAD_PROMPT.format(text=text)
+    
+    def validate(result: str) -> Optional[List[str]]:
+        # استخراج التغريدات
+        tweets = []
+        for match in TWEET_RE.finditer(result):
+            tweet_content = match.group(1).strip()
             
-            if response.status_code == 200:
-                result = response.json()['choices'][0]['message']['content'].strip()
-                
-                # استخراج التغريدات
-                tweets = []
-                for line in result.split('\n'):
-                    line = line.strip()
-                    if line.startswith('TWEET '):
-                        # استخراج المحتوى بعد "TWEET N:"
-                        if ':' in line:
-                            tweet_content = line.split(':', 1)[1].strip()
-                        else:
-                            continue
-                        
-                        # تحقق صارم من عدم وجود أي أحرف عربية
-                        arabic_chars = sum(1 for c in tweet_content if '\u0600' <= c <= '\u06FF')
-                        
-                        if arabic_chars > 0:  # حتى حرف عربي واحد = رفض
-                            logger.warning(f"⚠️ رفض تغريدة تحتوي على {arabic_chars} حرف عربي")
-                            logger.warning(f"   المحتوى المرفوض: {tweet_content[:100]}...")
-                            continue
-                        
-                        # تحقق من الطول
-                        if len(tweet_content) > 280:
-                            logger.warning(f"⚠️ تغريدة طويلة ({len(tweet_content)} حرف)، اقتصاص...")
-                            tweet_content = tweet_content[:277] + "..."
-                        
-                        if tweet_content and len(tweet_content) > 10:  # تأكد أنها ليست فارغة
-                            tweets.append(tweet_content)
-                
-                # تحقق نهائي شامل
-                if len(tweets) >= 3:
-                    # فحص جميع التغريدات معاً
-                    all_tweets_text = ' '.join(tweets)
-                    total_arabic = sum(1 for c in all_tweets_text if '\u0600' <= c <= '\u06FF')
-                    total_chars = len(all_tweets_text)
-                    
-                    if total_arabic > 0:
-                        arabic_percentage = (total_arabic / total_chars * 100) if total_chars > 0 else 0
-                        logger.error(f"❌ السلسلة تحتوي على {total_arabic} حرف عربي ({arabic_percentage:.1f}%)")
-                        logger.error("   إعادة المحاولة...")
-                        
-                        if attempt < max_retries:
-                            await asyncio.sleep(4)
-                            continue
-                        else:
-                            # في المحاولة الأخيرة، استخدم خطة بديلة
-                            logger.warning("⚠️ استخدام خطة بديلة للتغريدات")
-                            return None
-                    
-                    logger.info(f"✅ تم توليد {len(tweets)} تغريدة إنجليزية نظيفة 100%")
-                    
-                    # طباعة معاينة للتأكد
-                    for i, tweet in enumerate(tweets[:3], 1):
-                        logger.info(f"   Tweet {i}: {tweet[:80]}...")
-                    
-                    return tweets
-                else:
-                    logger.warning(f"⚠️ عدد التغريدات قليل ({len(tweets)})")
-                    if attempt < max_retries:
-                        await asyncio.sleep(4)
-                        continue
-                
-            elif response.status_code == 429:
-                logger.error(f"🚫 خطأ 429 - المفتاح {key_preview}")
-                mark_key_as_blocked(current_key)
-                await asyncio.sleep(2)
+            # تحقق صارم من عدم وجود أي أحرف عربية - العد الكامل فقط عند الرفض
+            if ARABIC_RE.search(tweet_content):  # حتى حرف عربي واحد = رفض
+                logger.warning("⚠️ رفض تغريدة تحتوي على %d حرف عربي", count_arabic(tweet_content))
+                logger.warning("   المحتوى المرفوض: %.100s...", tweet_content)
                 continue
-                
-            else:
-                logger.error(f"❌ خطأ: {response.status_code}")
-                try:
-                    error_detail = response.json()
-                    logger.error(f"   التفاصيل: {error_detail}")
-                except:
-                    pass
-                
-        except Exception as e:
-            logger.error(f"❌ خطأ في التوليد: {str(e)}")
+            
+            # تحقق من الطول
+            if len(tweet_content) > 280:
+                logger.warning("⚠️ تغريدة طويلة (%d حرف)، اقتصاص...", len(tweet_content))
+                tweet_content = tweet_content[:277] + "..."
+            
+            if tweet_content and len(tweet_content) > 10:  # تأكد أنها ليست فارغة
+                tweets.append(tweet_content)
+        
+        # تحقق نهائي شامل
+        if len(tweets) < 3:
+            logger.warning(f"⚠️ عدد التغريدات قليل ({len(tweets)})")
+            return None
+        
+        # لا حاجة لفحص السلسلة كاملة مرة أخرى: كل تغريدة مقبولة اجتازت فحص الأحرف العربية أعلاه
+        logger.info(f"✅ تم توليد {len(tweets)} تغريدة إنجليزية نظيفة 100%")
+        
+        # طباعة معاينة للتأكد
+        for i, tweet in enumerate(tweets[:3], 1):
+            logger.info("   Tweet %d: %.80s...", i, tweet)
         
-        if attempt < max_retries:
-            wait_time = 5
-            logger.info(f"⏳ انتظار {wait_time} ثانية قبل إعادة المحاولة...")
-            await asyncio.sleep(wait_time)
+        return tweets
     
-    logger.error("❌ فشل توليد سلسلة التغريدات بعد جميع المحاولات")
-    return None
+    tweets = await _call_openai(
+        messages=[
+            {"role": "system", "content": TWITTER_THREAD_SYSTEM},
+            {"role": "user", "content": user_prompt}
+        ],
+        temperature=0.7,  # أقل قليلاً للحصول على نتائج أكثر دقة
+        max_tokens=2000,
+        timeout=60,
+        max_retries=max_retries,
+        label="🐦 توليد سلسلة التغريدات",
+        validate=validate,
+        cache_key=ai_cache_key("twitter_thread", TWITTER_THREAD_VERSION, text)
+    )
+    
+    if not tweets:
+        logger.error("❌ فشل توليد سلسلة التغريدات بعد جميع المحاولات")
+    return tweets
 
 # ====== FORMAT TWITTER THREAD ======
 def format_twitter_thread(tweets: List[str]) -> str:
@@ -612,26 +1091,75 @@ def format_twitter_thread(tweets: List[str]) -> str:
     if not tweets:
         return ""
     
-    formatted = "🐦 TWITTER/X THREAD - Copy & Paste Each Tweet\n"
-    formatted += "=" * 60 + "\n\n"
+    # تجميع الأجزاء في قائمة ثم دمجها مرة واحدة بدلاً من += المتكرر
+    parts = ["🐦 TWITTER/X THREAD - Copy & Paste Each Tweet\n", SEP60, "\n\n"]
     
+    total = len(tweets)
     for i, tweet in enumerate(tweets, 1):
         char_count = len(tweet)
         status = "✅" if char_count <= 280 else "❌"
-        formatted += f"📝 TWEET {i}/{len(tweets)} ({char_count} chars) {status}\n"
-        formatted += f"{tweet}\n"
-        formatted += "-" * 60 + "\n\n"
+        parts.append(f"📝 TWEET {i}/{total} ({char_count} chars) {status}\n{tweet}\n")
+        parts.append(DASH60 + "\n\n")
     
-    formatted += "💡 How to Post:\n"
-    formatted += "1. Copy Tweet 1 → Post on Twitter/X\n"
-    formatted += "2. Reply with Tweet 2\n"
-    formatted += "3. Continue replying to build the thread\n"
+    parts.append(
+        "💡 How to Post:\n"
+        "1. Copy Tweet 1 → Post on Twitter/X\n"
+        "2. Reply with Tweet 2\n"
+        "3. Continue replying to build the thread\n"
+    )
     
-    return formatted
+    return "".join(parts)
 
 # ====== TELEGRAM SENDER ======
-async def send_to_telegram(message: str, media_path: Optional[str] = None, label: str = "Post") -> bool:
-    """نشر على قناة تيليغرام"""
+# أقصى مدة FloodWait نقبل انتظارها - ما دون 60 ثانية ينتظره Telethon تلقائياً
+FLOOD_WAIT_MAX = 120
+
+async def with_flood_wait(action: Callable[[], Awaitable[T]], max_waits: int = 2) -> T:
+    """تنفيذ طلب تيليغرام، والانتظار المدة التي يطلبها الخادم بالضبط عند FloodWaitError"""
+    for _ in range(max_waits):
+        try:
+            return await action()
+        except FloodWaitError as e:
+            if e.seconds > FLOOD_WAIT_MAX:
+                raise
+            logger.warning("⏳ FloodWait من تيليغرام: انتظار %d ثانية", e.seconds)
+            await asyncio.sleep(e.seconds + 1)
+    return await action()
+
+async def send_post_media(target, post: Message, caption: Optional[str] = None) -> bool:
+    """إرسال وسائط المنشور بالإشارة إلى الملف الموجود على خوادم تيليغرام دون تحميله وإعادة رفعه
+    
+    يُعيد False عند فشل خطوة الوسائط (مرجع منتهٍ، وسائط فارغة، فشل التحميل...)
+    ليُرسل المستدعي النص وحده بدلاً من إفشال المنشور كاملاً.
+    """
+    try:
+        try:
+            await with_flood_wait(lambda: client.send_file(target, post.media, caption=caption))
+            return True
+        except ChatForwardsRestrictedError:
+            # القناة المصدر تمنع إعادة التوجيه - الرجوع إلى التحميل ثم الرفع
+            logger.warning("⚠️ القناة المصدر تمنع إعادة استخدام الوسائط، تحميلها ورفعها...")
+            media_path = await post.download_media()
+            if not media_path:
+                raise ValueError("لم يُرجع التحميل أي ملف")
+            try:
+                await with_flood_wait(lambda: client.send_file(target, media_path, caption=caption))
+                return True
+            finally:
+                try:
+                    os.remove(media_path)
+                except OSError:
+                    pass
+    except FloodWaitError:
+        raise
+    except Exception as e:
+        logger.warning(f"⚠️ فشل إرسال الوسائط، سيُنشر النص فقط: {str(e)}")
+        return False
+
+async def send_to_telegram(message: str, post: Optional[Message] = None, label: str = "Post",
+                           target=None) -> bool:
+    """نشر على قناة تيليغرام (مع وسائط المنشور الأصلي إن وُجد)"""
+    target = target or CFG.target_channel
     try:
         logger.info(f"📤 جاري النشر على تيليغرام ({label})...")
         
@@ -639,29 +1167,27 @@ async def send_to_telegram(message: str, media_path: Optional[str] = None, label
         MAX_CAPTION_WITH_MEDIA = 1024
         MAX_MESSAGE_LENGTH = 4096
         
-        if media_path and os.path.exists(media_path):
+        if post and (post.photo or post.video):
             # مع وسائط - الحد 1024 حرف
             if len(message) > MAX_CAPTION_WITH_MEDIA:
                 logger.warning(f"⚠️ النص طويل للوسائط ({len(message)} حرف)")
                 logger.info("   إرسال النص كرسالة منفصلة + الوسائط")
                 
-                # إرسال الوسائط بدون نص
-                await client.send_file(TARGET_CHANNEL, media_path)
-                await asyncio.sleep(2)
+                # إرسال الوسائط بدون نص (فشلها لا يمنع نشر النص)
+                await send_post_media(target, post)
                 
                 # إرسال النص كرسالة منفصلة
                 if len(message) > MAX_MESSAGE_LENGTH:
                     # تقسيم النص
                     parts = [message[i:i+MAX_MESSAGE_LENGTH-50] for i in range(0, len(message), MAX_MESSAGE_LENGTH-50)]
                     for i, part in enumerate(parts, 1):
-                        await client.send_message(TARGET_CHANNEL, f"[{i}/{len(parts)}]\n{part}")
-                        if i < len(parts):
-                            await asyncio.sleep(1)
+                        await with_flood_wait(lambda: client.send_message(target, f"[{i}/{len(parts)}]\n{part}"))
                 else:
-                    await client.send_message(TARGET_CHANNEL, message)
+                    await with_flood_wait(lambda: client.send_message(target, message))
             else:
-                # النص ضمن الحد - إرسال عادي
-                await client.send_file(TARGET_CHANNEL, media_path, caption=message)
+                # النص ضمن الحد - إرسال عادي، ونص فقط إذا فشلت الوسائط
+                if not await send_post_media(target, post, caption=message):
+                    await with_flood_wait(lambda: client.send_message(target, message))
         else:
             # بدون وسائط - الحد 4096 حرف
             if len(message) > MAX_MESSAGE_LENGTH:
@@ -669,11 +1195,9 @@ async def send_to_telegram(message: str, media_path: Optional[str] = None, label
                 # تقسيم النص
                 parts = [message[i:i+MAX_MESSAGE_LENGTH-50] for i in range(0, len(message), MAX_MESSAGE_LENGTH-50)]
                 for i, part in enumerate(parts, 1):
-                    await client.send_message(TARGET_CHANNEL, f"[{i}/{len(parts)}]\n{part}")
-                    if i < len(parts):
-                        await asyncio.sleep(1)
+                    await with_flood_wait(lambda: client.send_message(target, f"[{i}/{len(parts)}]\n{part}"))
             else:
-                await client.send_message(TARGET_CHANNEL, message)
+                await with_flood_wait(lambda: client.send_message(target, message))
         
         logger.info(f"✅ تم النشر ({label}) بنجاح!")
         return True
@@ -682,89 +1206,129 @@ async def send_to_telegram(message: str, media_path: Optional[str] = None, label
         logger.error(f"❌ فشل النشر ({label}): {str(e)}")
         return False
 
+async def resolve_target():
+    """تحويل القناة الهدف إلى InputPeer مسبقاً (مع الرجوع إلى الاسم عند الفشل)"""
+    try:
+        return await client.get_input_entity(CFG.target_channel)
+    except Exception as e:
+        logger.warning(f"⚠️ تعذر تحديد القناة الهدف مسبقاً: {str(e)}")
+        return CFG.target_channel
+
+# ====== COLLOQUIAL CHECK ======
+# كلمات عامية شائعة - تُفحص كلها في مرور واحد عبر تعبير منتظم مُجمَّع
+COLLOQUIAL_WORDS = ['بحطلك', 'يدورلك', 'عشان', 'تلقى', 'تبي', 'هالموقع', 'مالها', 'بيضبطك']
+COLLOQUIAL_RE = re.compile("|".join(map(re.escape, COLLOQUIAL_WORDS)))
+
+# تصحيح العامية في المسار البديل (بدون AI) - الأطول أولاً حتى تتقدم العبارات على أجزائها
+COLLOQUIAL_REPLACEMENTS = {
+    'بحطلك': 'سأضع لك',
+    'يجدولك': 'يجدول لك',
+    'يدورلك': 'يبحث لك عن',
+    'عشان': 'لكي',
+    'تلقى': 'تجد',
+    'تبي': 'تريد',
+    'هالموقع': 'هذا الموقع',
+    'مالها داعي': 'لا داعي',
+    'بيضبطك': 'سيناسبك',
+    'يخليك': 'يتيح لك',
+    'اخرتها': 'في النهاية',
+}
+COLLOQUIAL_REPLACE_RE = re.compile(
+    "|".join(map(re.escape, sorted(COLLOQUIAL_REPLACEMENTS, key=len, reverse=True)))
+)
+
 # ====== MAIN EXECUTION ======
-async def main():
-    """البرنامج الرئيسي"""
-    logger.info("=" * 70)
+async def run_cycle() -> bool:
+    """دورة نشر واحدة: جلب، معالجة، ثم نشر"""
+    logger.info(SEP70)
     logger.info("🤖 بوت النشر التلقائي - عربي + إنجليزي")
-    logger.info(f"📅 {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}")
-    logger.info(f"📢 القناة: {TARGET_CHANNEL}")
-    logger.info(f"📡 المصادر: {', '.join(SOURCE_CHANNELS)}")
-    logger.info(f"🔑 المفاتيح: {len(OPENAI_API_KEYS)}")
-    logger.info("=" * 70)
+    # لقطة واحدة للوقت تُستخدم في الترويسة وتوقيت المنشور
+    now = datetime.now(timezone.utc)
+    logger.info(f"📅 {now:%Y-%m-%d %H:%M:%S} UTC")
+    logger.info(f"📢 القناة: {CFG.target_channel}")
+    logger.info(f"📡 المصادر: {', '.join(CFG.source_channels)}")
+    logger.info(f"🔑 المفاتيح: {len(CFG.openai_api_keys)}")
+    logger.info(SEP70)
+    
+    # تحديد القناة الهدف بالتوازي مع الجلب والتوليد بدلاً من انتظاره عند النشر
+    target_task = asyncio.create_task(resolve_target())
+    # حظر 429 يخص الدورة السابقة فقط - في وضع الخدمة لا يجب أن يُقصي المفتاح للأبد
+    reset_blocked_keys()
+    evict_ai_cache()
     
     try:
-        # الاتصال بـ Telegram
-        await client.start()
-        logger.info("✅ تم الاتصال بتيليغرام")
-        
         # 1️⃣ جلب المحتوى من القنوات
-        logger.info("\n" + "=" * 70)
+        logger.info("\n" + SEP70)
         logger.info("📥 الخطوة 1: جلب المحتوى من القنوات المصدر")
-        logger.info("=" * 70)
+        logger.info(SEP70)
         
         post = await get_content_from_sources()
         if not post:
-            logger.error("❌ لم يتم العثور على محتوى")
-            await client.disconnect()
-            return False
+            # لا جديد للنشر - ليس خطأ، تنتهي الدورة بنجاح دون نشر
+            logger.info("✅ لا يوجد محتوى جديد للنشر في هذه الدورة")
+            return True
         
         original_text = post.text.strip()
         logger.info(f"✅ تم جلب المحتوى ({len(original_text)} حرف)")
-        logger.info(f"📝 معاينة: {original_text[:150]}...")
+        logger.info("📝 معاينة: %.150s...", original_text)
         
-        # 2️⃣ كشف اللغة والترجمة إذا لزم
-        logger.info("\n" + "=" * 70)
-        logger.info("🔍 الخطوة 2: كشف اللغة والترجمة")
-        logger.info("=" * 70)
+        # 2️⃣ كشف اللغة
+        logger.info("\n" + SEP70)
+        logger.info("🔍 الخطوة 2: كشف اللغة")
+        logger.info(SEP70)
         
         detected_lang = detect_language(original_text)
         logger.info(f"🌐 اللغة المكتشفة: {detected_lang}")
         
-        # المحتوى العربي (مترجم أو أصلي)
-        arabic_text = original_text
-        
         if detected_lang != "arabic":
-            logger.info("🔄 المحتوى بلغة أخرى، جاري الترجمة للعربية...")
-            translated = await translate_to_arabic(original_text)
-            
-            if translated:
-                arabic_text = translated
-                logger.info(f"✅ تمت الترجمة ({len(arabic_text)} حرف)")
-                logger.info(f"📝 معاينة الترجمة: {arabic_text[:150]}...")
-            else:
-                logger.warning("⚠️ فشلت الترجمة، سنستخدم النص الأصلي")
-            
-            await asyncio.sleep(3)
+            # الترجمة تتم ضمن طلب توليد المنشور العربي نفسه - طلب واحد بدلاً من اثنين
+            logger.info("🔄 المحتوى بلغة أخرى، سيُترجم ضمن توليد المنشور العربي")
         else:
             logger.info("✅ المحتوى بالعربية أصلاً")
         
-        # تحميل الوسائط
-        media_path = None
-        if post.photo or post.video:
-            try:
-                logger.info("📥 تحميل الوسائط...")
-                media_path = await post.download_media()
-                logger.info(f"✅ تم تحميل الوسائط")
-            except Exception as e:
-                logger.warning(f"⚠️ فشل تحميل الوسائط: {str(e)}")
-        
-        # 3️⃣ توليد المنشور العربي
-        logger.info("\n" + "=" * 70)
-        logger.info("🇸🇦 الخطوة 3: توليد المنشور العربي (فيسبوك/إنستغرام)")
-        logger.info("=" * 70)
-        
-        arabic_post = await generate_arabic_post(arabic_text)
+        # الوسائط تُرسل بالإشارة إلى ملفها على خوادم تيليغرام - لا حاجة لتحميلها
+        has_media = bool(post.photo or post.video)
+        
+        # 3️⃣ توليد المنشور العربي وسلسلة التغريدات بالتوازي - طلبان مستقلان
+        logger.info("\n" + SEP70)
+        logger.info("🇸🇦 الخطوة 3: توليد المنشور العربي (فيسبوك/إنستغرام) + التغريدات (تويتر/X)")
+        logger.info(SEP70)
+        
+        arabic_post, twitter_tweets = await asyncio.gather(
+            generate_arabic_post(original_text),
+            generate_english_twitter_thread(original_text),
+            return_exceptions=True
+        )
+        if isinstance(arabic_post, Exception):
+            logger.error(f"❌ خطأ في توليد المنشور العربي: {str(arabic_post)}")
+            arabic_post = None
+        if isinstance(twitter_tweets, Exception):
+            logger.error(f"❌ خطأ في توليد التغريدات: {str(twitter_tweets)}")
+            twitter_tweets = None
         
         if not arabic_post or len(arabic_post) < 100:
             logger.warning("⚠️ فشل AI أو المحتوى قصير، استخدام النص المعالج مباشرة")
             
+            # المحتوى العربي (مترجم أو أصلي) - الترجمة مطلوبة فقط في هذا المسار البديل
+            arabic_text = original_text
+            
+            if detected_lang != "arabic":
+                logger.info("🔄 جاري ترجمة النص الأصلي للعربية...")
+                translated = await translate_to_arabic(original_text)
+                
+                if translated:
+                    arabic_text = translated
+                    logger.info(f"✅ تمت الترجمة ({len(arabic_text)} حرف)")
+                    logger.info("📝 معاينة الترجمة: %.150s...", arabic_text)
+                else:
+                    logger.warning("⚠️ فشلت الترجمة، سنستخدم النص الأصلي")
+            
             # التحقق من سبب الفشل
-            if len(BLOCKED_KEYS) >= len(OPENAI_API_KEYS):
+            if len(BLOCKED_KEYS) >= len(CFG.openai_api_keys):
                 logger.error("")
-                logger.error("=" * 70)
+                logger.error(SEP70)
                 logger.error("⛔ تنبيه: جميع مفاتيح OpenAI وصلت للحد الأقصى!")
-                logger.error("=" * 70)
+                logger.error(SEP70)
                 logger.error("")
                 logger.error("سيتم استخدام المحتوى الأصلي بدون معالجة AI.")
                 logger.error("للحصول على أفضل النتائج:")
@@ -776,23 +1340,8 @@ async def main():
             # تحويل العامية للفصحى إن أمكن
             cleaned_text = arabic_text
             
-            # استبدال بعض الكلمات العامية الشائعة
-            colloquial_replacements = {
-                'بحطلك': 'سأضع لك',
-                'يجدولك': 'يجدول لك',
-                'يدورلك': 'يبحث لك عن',
-                'عشان': 'لكي',
-                'تلقى': 'تجد',
-                'تبي': 'تريد',
-                'هالموقع': 'هذا الموقع',
-                'مالها داعي': 'لا داعي',
-                'بيضبطك': 'سيناسبك',
-                'يخليك': 'يتيح لك',
-                'اخرتها': 'في النهاية',
-            }
-            
-            for colloquial, formal in colloquial_replacements.items():
-                cleaned_text = cleaned_text.replace(colloquial, formal)
+            # استبدال بعض الكلمات العامية الشائعة - مرور واحد على النص
+            cleaned_text = COLLOQUIAL_REPLACE_RE.sub(lambda m: COLLOQUIAL_REPLACEMENTS[m.group()], cleaned_text)
             
             arabic_post = f"""📢 {cleaned_text}
 
@@ -801,13 +1350,13 @@ async def main():
 #تقنية #تكنولوجيا #ابتكار #ذكاء_اصطناعي #AI #Tech #Innovation #TechNews"""
         
         # التأكد من وجود محتوى عربي
-        arabic_chars_in_post = sum(1 for c in arabic_post if '\u0600' <= c <= '\u06FF')
+        arabic_chars_in_post = count_arabic(arabic_post)
         if arabic_chars_in_post < 50:
             logger.error("❌ المنشور العربي لا يحتوي على عربي كافٍ!")
-            logger.error(f"   النص الحالي: {arabic_post[:200]}...")
+            logger.error("   النص الحالي: %.200s...", arabic_post)
             
             # التحقق من سبب الفشل
-            if len(BLOCKED_KEYS) >= len(OPENAI_API_KEYS):
+            if len(BLOCKED_KEYS) >= len(CFG.openai_api_keys):
                 logger.error("")
                 logger.error("⛔ السبب: جميع مفاتيح OpenAI وصلت للحد الأقصى!")
                 logger.error("   لا يمكن ترجمة المحتوى للعربية.")
@@ -817,12 +1366,10 @@ async def main():
                 logger.error("  2. انتظر 60 دقيقة وأعد المحاولة")
                 logger.error("")
                 logger.error("❌ إيقاف البرنامج - لا يوجد محتوى عربي للنشر")
-                await client.disconnect()
                 return False
         
         # فحص العامية في المحتوى
-        colloquial_words = ['بحطلك', 'يدورلك', 'عشان', 'تلقى', 'تبي', 'هالموقع', 'مالها', 'بيضبطك']
-        found_colloquial = [word for word in colloquial_words if word in arabic_post]
+        found_colloquial = list(dict.fromkeys(COLLOQUIAL_RE.findall(arabic_post)))
         
         if found_colloquial:
             logger.warning("⚠️ تم اكتشاف كلمات عامية في المنشور:")
@@ -832,7 +1379,7 @@ async def main():
         
         # التحقق من طول المنشور العربي
         # تيليغرام: 1024 حرف مع وسائط، 4096 بدون
-        max_caption_length = 1000 if media_path else 4000
+        max_caption_length = 1000 if has_media else 4000
         
         if len(arabic_post) > max_caption_length:
             logger.warning(f"⚠️ المنشور العربي طويل جداً ({len(arabic_post)} حرف)")
@@ -856,7 +1403,7 @@ async def main():
             arabic_post += "#تقنية #Tech #AI"
         
         # إضافة التوقيت
-        timestamp = f"\n\n🕒 {datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')}"
+        timestamp = f"\n\n🕒 {now:%Y-%m-%d %H:%M} UTC"
         
         # التحقق مرة أخرى من الطول النهائي
         if len(arabic_post + timestamp) > max_caption_length:
@@ -867,30 +1414,12 @@ async def main():
         arabic_final = arabic_post + timestamp
         
         logger.info(f"✅ المنشور العربي جاهز ({len(arabic_final)} حرف)")
-        logger.info(f"📝 معاينة:\n{arabic_final[:300]}...\n")
-        
-        # 4️⃣ توليد سلسلة التغريدات الإنجليزية
-        logger.info("\n" + "=" * 70)
-        logger.info("🐦 الخطوة 4: توليد سلسلة التغريدات (تويتر/X)")
-        logger.info("=" * 70)
-        
-        await asyncio.sleep(5)  # تأخير بين الطلبين
+        logger.info("📝 معاينة:\n%.300s...\n", arabic_final)
         
-        # تعريف المتغير أولاً
-        twitter_tweets = None
-        
-        try:
-            twitter_tweets = await generate_english_twitter_thread(original_text)
-        except Exception as e:
-            logger.error(f"❌ خطأ في توليد التغريدات: {str(e)}")
-            twitter_tweets = None
-        
-        # 4️⃣ توليد سلسلة التغريدات الإنجليزية
-        logger.info("\n" + "=" * 70)
-        logger.info("🐦 الخطوة 4: توليد سلسلة التغريدات (تويتر/X)")
-        logger.info("=" * 70)
-        
-        await asyncio.sleep(5)  # تأخير بين الطلبين
+        # 4️⃣ تجهيز سلسلة التغريدات الإنجليزية
+        logger.info("\n" + SEP70)
+        logger.info("🐦 الخطوة 4: تجهيز سلسلة التغريدات (تويتر/X)")
+        logger.info(SEP70)
         
         if not twitter_tweets:
             logger.warning("⚠️ فشل AI للتغريدات، محاولة أخيرة بترجمة مباشرة...")
@@ -919,22 +1448,20 @@ async def main():
         twitter_formatted = format_twitter_thread(twitter_tweets)
         
         logger.info(f"✅ سلسلة التغريدات جاهزة ({len(twitter_tweets)} تغريدة)")
-        logger.info(f"📝 معاينة:\n{twitter_formatted[:400]}...\n")
+        logger.info("📝 معاينة:\n%.400s...\n", twitter_formatted)
         
         # 5️⃣ النشر على تيليغرام
-        logger.info("\n" + "=" * 70)
+        logger.info("\n" + SEP70)
         logger.info("📤 الخطوة 5: النشر على تيليغرام")
-        logger.info("=" * 70)
+        logger.info(SEP70)
         
         # التحقق النهائي قبل النشر
         if not arabic_final or len(arabic_final) < 50:
             logger.error("❌ المنشور العربي فارغ أو قصير جداً!")
-            await client.disconnect()
             return False
         
         if not twitter_formatted or len(twitter_formatted) < 50:
             logger.error("❌ سلسلة التغريدات فارغة!")
-            await client.disconnect()
             return False
         
         logger.info("✅ كلا المنشورين جاهزان للنشر")
@@ -942,33 +1469,26 @@ async def main():
         logger.info(f"   📝 سلسلة التغريدات: {len(twitter_formatted)} حرف")
         logger.info("")
         
+        target = await target_task
+        
         # نشر المنشور العربي (مع الوسائط)
         logger.info("📤 نشر المنشور العربي (1/2)...")
-        success_ar = await send_to_telegram(arabic_final, media_path, "🇸🇦 عربي - فيسبوك/إنستغرام")
+        success_ar = await send_to_telegram(arabic_final, post, "🇸🇦 عربي - فيسبوك/إنستغرام", target)
         
-        if not success_ar:
+        if success_ar:
+            mark_as_published(original_text)
+            advance_channel_cursor(post.chat_id, post.id)
+        else:
             logger.error("❌ فشل نشر المنشور العربي!")
         
-        await asyncio.sleep(5)
-        
         # نشر سلسلة التغريدات الإنجليزية (بدون وسائط)
         logger.info("📤 نشر سلسلة التغريدات الإنجليزية (2/2)...")
-        success_en = await send_to_telegram(twitter_formatted, None, "🐦 إنجليزي - تويتر/X")
-        
-        # تنظيف الملفات المؤقتة
-        if media_path and os.path.exists(media_path):
-            try:
-                os.remove(media_path)
-                logger.info("🗑️ تم حذف الملف المؤقت")
-            except:
-                pass
-        
-        await client.disconnect()
+        success_en = await send_to_telegram(twitter_formatted, None, "🐦 إنجليزي - تويتر/X", target)
         
         # 6️⃣ النتيجة النهائية
-        logger.info("\n" + "=" * 70)
+        logger.info("\n" + SEP70)
         logger.info("📊 النتيجة النهائية")
-        logger.info("=" * 70)
+        logger.info(SEP70)
         
         if success_ar and success_en:
             logger.info("✨ نجح! تم النشر بنجاح على تيليغرام!")
@@ -978,7 +1498,7 @@ async def main():
             logger.info("  2️⃣ سلسلة التغريدات الإنجليزية → تويتر / X ✅")
             logger.info("")
             logger.info("🔑 إحصائيات:")
-            logger.info(f"  • المفاتيح المستخدمة: {len(OPENAI_API_KEYS) - len(BLOCKED_KEYS)}/{len(OPENAI_API_KEYS)}")
+            logger.info(f"  • المفاتيح المستخدمة: {len(CFG.openai_api_keys) - len(BLOCKED_KEYS)}/{len(CFG.openai_api_keys)}")
             logger.info(f"  • اللغة الأصلية: {detected_lang}")
             logger.info(f"  • تمت الترجمة: {'نعم' if detected_lang != 'arabic' else 'لا'}")
             logger.info("")
@@ -995,19 +1515,38 @@ async def main():
             logger.error("❌ فشل النشر بالكامل!")
             logger.error("  تحقق من الأخطاء أعلاه وحاول مرة أخرى")
         
-        logger.info("=" * 70)
+        logger.info(SEP70)
         
         return success_ar and success_en
         
     except Exception as e:
         logger.error(f"❌ خطأ فادح: {str(e)}")
-        import traceback
         logger.error(traceback.format_exc())
-        try:
-            await client.disconnect()
-        except:
-            pass
         return False
+    finally:
+        target_task.cancel()
+
+async def main() -> bool:
+    """البرنامج الرئيسي: دورة واحدة، أو خدمة مستمرة إذا حُدد RUN_INTERVAL"""
+    global HTTP_SESSION
+    HTTP_SESSION = create_http_session()
+    
+    try:
+        # الاتصال بـ Telegram مرة واحدة لجميع الدورات
+        await client.start()
+        logger.info("✅ تم الاتصال بتيليغرام")
+        
+        if CFG.run_interval <= 0:
+            return await run_cycle()
+        
+        logger.info(f"🔁 وضع الخدمة المستمرة: دورة كل {CFG.run_interval} ثانية")
+        while True:
+            await run_cycle()
+            logger.info(f"⏳ الدورة التالية بعد {CFG.run_interval} ثانية")
+            await asyncio.sleep(CFG.run_interval)
+    finally:
+        await HTTP_SESSION.close()
+        await client.disconnect()
 
 if __name__ == "__main__":
     try:
@@ -1024,13 +1563,13 @@ if __name__ == "__main__":
         logger.info("  5️⃣  إرسال المنشورين إلى قناة تيليغرام")
         logger.info("")
         logger.info("⚙️  الإعدادات:")
-        logger.info(f"  • عدد مفاتيح OpenAI: {len(OPENAI_API_KEYS)}")
-        logger.info(f"  • القنوات المصدر: {len(SOURCE_CHANNELS)}")
-        logger.info(f"  • الحد الأدنى للمحتوى: {MIN_CONTENT_LENGTH} حرف")
+        logger.info(f"  • عدد مفاتيح OpenAI: {len(CFG.openai_api_keys)}")
+        logger.info(f"  • القنوات المصدر: {len(CFG.source_channels)}")
+        logger.info(f"  • الحد الأدنى للمحتوى: {CFG.min_content_length} حرف")
         logger.info("")
         
         # تحذير إذا كان هناك مفتاح واحد فقط
-        if len(OPENAI_API_KEYS) < 2:
+        if len(CFG.openai_api_keys) < 2:
             logger.warning("⚠️  تحذير: يوجد مفتاح OpenAI واحد فقط!")
             logger.warning("   للحصول على أفضل النتائج:")
             logger.warning("   • أضف 2-5 مفاتيح إضافية:")
@@ -1040,10 +1579,16 @@ if __name__ == "__main__":
             logger.info("")
         
         logger.info("🚀 بدء التشغيل...")
-        logger.info("=" * 70)
+        logger.info(SEP70)
         logger.info("")
         
-        result = asyncio.run(main())
+        # uvloop.install() مهمل منذ بايثون 3.12 - نمرر مصنع الحلقة إلى Runner بدلاً منه
+        loop_factory = uvloop.new_event_loop if uvloop else None
+        if loop_factory:
+            logger.info("⚡ استخدام uvloop كحلقة أحداث")
+        
+        with asyncio.Runner(loop_factory=loop_factory) as runner:
+            result = runner.run(main())
         
         logger.info("")
         if result:
@@ -1058,6 +1603,5 @@ if __name__ == "__main__":
         sys.exit(0)
     except Exception as e:
         logger.error(f"❌ خطأ فادح: {str(e)}")
-        import traceback
         logger.error(traceback.format_exc())
         sys.exit(1)